@@ -1,7 +1,6 @@
 import logging
 
 import click
-import numpy as np
 import pytest
 
 from src.cli.types import MATRIX_TYPE, INT_LIST_TYPE
@@ -35,8 +34,8 @@ def cli():
 )
 def solve(mat, sampling, sequence):
     hmm = HiddenMarkovModel(
-        transition_matrix=np.array(mat, dtype=np.longdouble),
-        sampling_probabilities=np.array(sampling, dtype=np.longdouble),
+        transition_matrix=mat,
+        sampling_probabilities=sampling,
     )
     res = viterbi(hmm, sequence)
 
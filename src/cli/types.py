@@ -15,6 +15,11 @@ TWO_DIMENSIONAL_ARRAY_PATTERN = (
 INTEGER_PATTERN = r"\-?\d+"
 INT_LIST_PATTERN = rf"(?:\[(?:{INTEGER_PATTERN},)*{NUMBER_PATTERN}])|(?:\[])"
 
+# The patterns above, compiled once at import time rather than on every parse.
+_TWO_DIMENSIONAL_ARRAY_REGEX = re.compile(TWO_DIMENSIONAL_ARRAY_PATTERN)
+_INTEGER_REGEX = re.compile(INTEGER_PATTERN)
+_INT_LIST_REGEX = re.compile(INT_LIST_PATTERN)
+
 
 class MatrixType(click.ParamType):
     """Represents a matrix type parameter. Validates and converts values
@@ -26,26 +31,24 @@ class MatrixType(click.ParamType):
         # Delete all spaces and check if the string has a two-dimensional
         # array form using regular expressions.
         clean_string = value_string.replace(" ", "")
-        match = re.fullmatch(TWO_DIMENSIONAL_ARRAY_PATTERN, clean_string)
+        match = _TWO_DIMENSIONAL_ARRAY_REGEX.fullmatch(clean_string)
 
         if match is None:
             self.fail("Provided string does not represent a 2D-array!")
 
-        # Now that we know our array is a two-dimensional array, we can parse
-        # it.
-        row_strings = re.findall(ONE_DIMENSIONAL_ARRAY_PATTERN, clean_string)
-
-        matrix = [
-            [float(n) for n in re.findall(NUMBER_PATTERN, row_string)]
-            for row_string in row_strings
+        # Now that we know our array is a two-dimensional array, we know
+        # exactly where its rows begin and end, so we can split it into rows
+        # without another regular expression. numpy then converts the numbers
+        # of each row directly.
+        rows = [
+            np.array(row_string.split(","), dtype=np.longdouble)
+            for row_string in clean_string[2:-2].split("],[")
         ]
 
-        # If the rows of our new matrix do not all have the same size, then
-        # numpy will throw an exception when we attempt to construct an array.
-        try:
-            return np.array(matrix, dtype=np.longdouble)
-        except ValueError as e:
-            self.fail(str(e))
+        if any(len(row) != len(rows[0]) for row in rows):
+            self.fail("Rows of the provided 2D-array do not all have the same size!")
+
+        return np.stack(rows)
 
     def convert(
         self, value: Any, param: Optional[Parameter], ctx: Optional[Context]
@@ -88,7 +91,8 @@ class MatrixType(click.ParamType):
 
         Returns:
              The provided value as a two-dimensional NDArray with data type
-             float64.
+             longdouble. NDArrays that already have this data type are
+             returned as-is, without copying.
 
         Raises:
             BadParameter: if the provided value is neither a 2D-NDArray nor a
@@ -98,7 +102,7 @@ class MatrixType(click.ParamType):
             if len(value.shape) != 2:
                 self.fail("Provided array is not two-dimensional!")
 
-            return np.array(value, dtype=np.longdouble)
+            return np.asarray(value, dtype=np.longdouble)
         elif isinstance(value, str):
             return self._parse_string(value)
         else:
@@ -119,14 +123,14 @@ class IntListType(click.ParamType):
         # Delete all spaces and check if the string has a one-dimensional
         # array form using regular expressions.
         clean_string = value_string.replace(" ", "")
-        match = re.fullmatch(INT_LIST_PATTERN, clean_string)
+        match = _INT_LIST_REGEX.fullmatch(clean_string)
 
         if match is None:
             self.fail("Provided string does not represent a 2D-array!")
 
         # Now that we know our array is a one-dimensional array, we can parse
         # it.
-        element_strings = re.findall(INTEGER_PATTERN, clean_string)
+        element_strings = _INTEGER_REGEX.findall(clean_string)
         return [int(n) for n in element_strings]
 
     def convert(
@@ -1,10 +1,23 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Optional
 
 from attrs import frozen, field, Attribute
 import numpy as np
-from scipy import linalg
+
+
+def read_only_copy(array: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    """Copies an array and marks the copy as read-only.
+
+    Args:
+        array: The array to copy.
+
+    Returns:
+        A read-only copy of array.
+    """
+    array_copy = np.array(array)
+    array_copy.setflags(write=False)
+    return array_copy
 
 
 def valid_tranisition_matrix(
@@ -32,13 +45,14 @@ def valid_tranisition_matrix(
     if shape[0] != shape[1]:
         raise ValueError("Matrix is not square!")
 
-    for entry in mat.flatten():
-        if entry < 0.0:
-            raise ValueError("Rows include negative probabilities!")
+    if (mat < 0.0).any():
+        raise ValueError("Rows include negative probabilities!")
 
-    for rowSum in mat.sum(axis=1):
-        if rowSum - 1.0 > 1e-5:
-            raise ValueError("Matrix is not stochastic!")
+    # A tolerance of 1e-5 doesn't need extended precision, so the comparison
+    # is done on float64 row sums.
+    row_sums = mat.sum(axis=1).astype(np.float64)
+    if not (np.abs(row_sums - 1.0) <= 1e-5).all():
+        raise ValueError("Matrix is not stochastic!")
 
 
 def valid_sampling_probabilities(
@@ -69,13 +83,12 @@ def valid_sampling_probabilities(
     if len(mat_shape) != len(sampling_shape):
         raise ValueError("Does not provide a distribution for each state!")
 
-    for entry in sampling_probabilities.flatten():
-        if entry < 0.0:
-            raise ValueError("Distributions on marbles include negative probabilities!")
+    if (sampling_probabilities < 0.0).any():
+        raise ValueError("Distributions on marbles include negative probabilities!")
 
-    for rowSum in sampling_probabilities.sum(axis=1):
-        if rowSum - 1.0 > 1e-5:
-            raise ValueError("Not a valid distribution!")
+    row_sums = sampling_probabilities.sum(axis=1).astype(np.float64)
+    if not (np.abs(row_sums - 1.0) <= 1e-5).all():
+        raise ValueError("Not a valid distribution!")
 
 
 @frozen()
@@ -99,51 +112,94 @@ class HiddenMarkovModel:
             are in bag i, and S[i][j] will be interpreted as the probability
             of drawing marble j, given we are in bag i. The entries of S[i]
             must sum to 1.0 for every bag i.
+
+    Both arrays are copied when the HMM is constructed, and the copies are
+    read-only. Modifying the arrays passed to the constructor does not affect
+    the HMM.
     """
 
     transition_matrix: np.ndarray[Any, np.dtype[np.longdouble]] = field(
-        validator=valid_tranisition_matrix
+        converter=read_only_copy, validator=valid_tranisition_matrix
     )
     sampling_probabilities: np.ndarray[Any, np.dtype[np.longdouble]] = field(
-        validator=valid_sampling_probabilities
+        converter=read_only_copy, validator=valid_sampling_probabilities
+    )
+
+    # HMMs (including their arrays) are immutable, so the steady-state
+    # probabilities only need to be computed once. They are computed lazily,
+    # on the first call to steady_state_probabilities(), and stored here.
+    _steady_state: Optional[np.ndarray[Any, np.dtype[np.float64]]] = field(
+        default=None, init=False, repr=False, eq=False
     )
 
-    def steady_state_probabilities(self) -> np.ndarray[Any, np.dtype[np.longdouble]]:
+    def steady_state_probabilities(self) -> np.ndarray[Any, np.dtype[np.float64]]:
         """Computes the steady-state probabilities of this Hidden Markov Model.
 
         By definition, the steady-state probability vector w satisfies:
 
         wT = w
 
-        This is equivalent to being a left eigenvector with eigenvalue 1. So,
-        we can find this vector with linear algebra via:
+        This is equivalent to being a left eigenvector with eigenvalue 1, i.e.,
 
-        ker((T - I)^T) = { a*w }
+        (T - I)^T w^T = 0
 
-        for some scalar a. We then can normalize a*w to find w.
+        Since w is also a distribution, its entries must sum to 1. Appending
+        this normalization constraint as an extra row of ones gives the
+        (n + 1) x n linear system
+
+        [(T - I)^T; 1 ... 1] w^T = [0 ... 0 1]^T
+
+        which is consistent, so we can solve it directly via least squares
+        instead of computing the entire null space of (T - I)^T. This vector
+        is only computed once per HMM; later calls return the same
+        (read-only) array.
+
+        LAPACK does not support long doubles, so this vector is computed (and
+        returned) in float64.
 
         Returns:
             The steady-state probability vector for this HMM's transition
             matrix.
+
+        Raises:
+            ValueError: if this HMM does not have a unique steady-state
+                distribution.
         """
+        if self._steady_state is not None:
+            return self._steady_state
+
         n = len(self.transition_matrix)
 
-        kernel_matrix = (self.transition_matrix - np.identity(n)).transpose()
-        eigen_basis = linalg.null_space(kernel_matrix)
+        transition_matrix = self.transition_matrix.astype(np.float64)
+        system = np.vstack(
+            [(transition_matrix - np.identity(n)).transpose(), np.ones(n)]
+        )
+        target = np.zeros(n + 1)
+        target[-1] = 1.0
+
+        steady_state_vector, _, rank, _ = np.linalg.lstsq(system, target, rcond=None)
 
         # Because this HMM's transition matrix is stochastic, 1 is an
         # eigenvalue. However, it still is not guaranteed to have a unique
         # steady-state distribution, so we must check. Otherwise, we can't
-        # return a steady-state distribution that makes sense.
-        geometric_multiplicity = eigen_basis.shape[1]
-
-        if geometric_multiplicity > 1:
+        # return a steady-state distribution that makes sense. The row of ones
+        # is never in the row space of (T - I)^T, so our system has full rank
+        # n exactly when (T - I) has rank n - 1, i.e., when the eigenvalue 1
+        # has geometric multiplicity 1.
+        if rank < n:
             raise ValueError(
                 "HMM does not have a unique stationary distribution!\n"
-                f"Eigen-basis for lambda=1: {eigen_basis}"
+                f"Geometric multiplicity for lambda=1: {n - rank + 1}"
             )
 
-        steady_state_vector = eigen_basis.flatten()
-
-        # Before returning, we need to normalize the distribution:
-        return steady_state_vector / steady_state_vector.sum()
+        # The normalization constraint is already part of our system, but
+        # round-off can leave bags that are never visited with slightly
+        # negative probabilities, so we clip them to zero and renormalize
+        # before returning.
+        steady_state_vector = np.maximum(steady_state_vector, 0.0)
+        steady_state_vector /= steady_state_vector.sum()
+        steady_state_vector.setflags(write=False)
+
+        # This class is frozen, so we must bypass attrs to cache the vector.
+        object.__setattr__(self, "_steady_state", steady_state_vector)
+        return steady_state_vector
@@ -1,17 +1,431 @@
+import importlib.util
 import logging
-from typing import Sequence
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
+import numba
 import numpy as np
 
 from src.viterbi.hidden_markov_model import HiddenMarkovModel
 
 _logger = logging.getLogger(__name__)
 
+# HMMs with at most this many bags are solved with a forward pass specialized
+# to their exact number of bags (see _make_viterbi_core).
+_MAX_SPECIALIZED_BAGS = 8
+
+# HMMs with at least this many bags split each step of the forward pass across
+# threads (see _parallel_viterbi_core). Each step is dispatched to the thread
+# pool separately, and a step only does O(n^2) work, so for smaller HMMs the
+# dispatch dominates: on 200,000 marbles, the serial kernel is still ahead at
+# 64 bags and only draws level at around 256. This is a conservative cutoff
+# rather than a tuned one; it depends on the machine and its number of cores.
+_MIN_PARALLEL_BAGS = 256
+
+# Generated source files for specialized forward passes. These are real
+# modules, rather than strings passed to exec, so that Numba can cache their
+# compiled code on disk like every other kernel in this module.
+_SPECIALIZED_CORES_DIR = Path(__file__).parent / "__pycache__" / "specialized_cores"
+
+# Specialized forward passes, by number of bags.
+_specialized_viterbi_cores: Dict[int, Callable] = {}
+
+
+@numba.njit(cache=True)
+def _update_bag(
+    log_probabilities: np.ndarray[Any, np.dtype[np.float64]],
+    log_transition_matrix: np.ndarray[Any, np.dtype[np.float64]],
+    log_emissions: np.ndarray[Any, np.dtype[np.float64]],
+    new_log_probabilities: np.ndarray[Any, np.dtype[np.float64]],
+    parents: np.ndarray[Any, np.dtype[np.int32]],
+    bag: int,
+) -> None:
+    """Finds the most likely way to add a single bag in a step of Viterbi's
+    algorithm. The arguments are as in _viterbi_step."""
+    max_parent_log_probability = -np.inf
+    most_likely_parent = 0
+
+    for parent in range(log_transition_matrix.shape[0]):
+        # Find log Pr(parent so far) + log T(parent -> bag)
+        p = log_probabilities[parent] + log_transition_matrix[parent, bag]
+
+        if p > max_parent_log_probability:
+            max_parent_log_probability = p
+            most_likely_parent = parent
+
+    new_log_probabilities[bag] = max_parent_log_probability + log_emissions[bag]
+    parents[bag] = most_likely_parent
+
+
+@numba.njit(cache=True)
+def _serial_viterbi_step(
+    log_probabilities: np.ndarray[Any, np.dtype[np.float64]],
+    log_transition_matrix: np.ndarray[Any, np.dtype[np.float64]],
+    log_emissions: np.ndarray[Any, np.dtype[np.float64]],
+    new_log_probabilities: np.ndarray[Any, np.dtype[np.float64]],
+    parents: np.ndarray[Any, np.dtype[np.int32]],
+) -> None:
+    """Runs a single step of Viterbi's algorithm on log-probabilities, one bag
+    at a time. The arguments are as in _viterbi_step."""
+    for bag in range(log_transition_matrix.shape[0]):
+        _update_bag(
+            log_probabilities,
+            log_transition_matrix,
+            log_emissions,
+            new_log_probabilities,
+            parents,
+            bag,
+        )
+
+
+@numba.njit(cache=True, parallel=True)
+def _viterbi_step(
+    log_probabilities: np.ndarray[Any, np.dtype[np.float64]],
+    log_transition_matrix: np.ndarray[Any, np.dtype[np.float64]],
+    log_emissions: np.ndarray[Any, np.dtype[np.float64]],
+    new_log_probabilities: np.ndarray[Any, np.dtype[np.float64]],
+    parents: np.ndarray[Any, np.dtype[np.int32]],
+) -> None:
+    """Runs a single step of Viterbi's algorithm on log-probabilities.
+
+    Each bag's most likely parent is independent of every other bag's, so the
+    bags are split across threads. This step is deliberately its own function
+    rather than a parallel loop inside _parallel_viterbi_core's loop over
+    marbles: launching a parallel loop once per marble from within a single
+    Numba function crashes for long (~1,000,000 marble) sequences.
+
+    Args:
+        log_probabilities: The log-probability of the most likely path ending
+            in each bag so far.
+        log_transition_matrix: The (n, n) log-transition matrix of the HMM.
+        log_emissions: The log-probability of the current marble in each bag.
+        new_log_probabilities: Output for the log-probability of the most
+            likely path ending in each bag after the current marble.
+        parents: Output for the most likely parent of each bag.
+    """
+    for bag in numba.prange(log_transition_matrix.shape[0]):
+        _update_bag(
+            log_probabilities,
+            log_transition_matrix,
+            log_emissions,
+            new_log_probabilities,
+            parents,
+            bag,
+        )
+
+
+@numba.njit(cache=True)
+def _start_forward_pass(
+    log_sampling_probabilities_by_marble: np.ndarray[Any, np.dtype[np.float64]],
+    log_init: np.ndarray[Any, np.dtype[np.float64]],
+    sequence: np.ndarray[Any, np.dtype[np.int64]],
+) -> Tuple[np.ndarray[Any, np.dtype[np.float64]], np.ndarray[Any, np.dtype[np.int32]]]:
+    """Allocates the outputs of a forward pass and fills in the first marble.
+
+    Returns:
+        A pair (log_probabilities, parents). Row i % 2 of log_probabilities
+        holds the log-probabilities after marble i, so each step reads one
+        row and overwrites the other. parents is empty, with one row for each
+        marble after the first.
+    """
+    num_bags = log_init.shape[0]
+
+    log_probabilities = np.empty((2, num_bags), dtype=np.float64)
+    parents = np.empty((sequence.shape[0] - 1, num_bags), dtype=np.int32)
+
+    log_emissions = log_sampling_probabilities_by_marble[sequence[0]]
+    for bag in range(num_bags):
+        log_probabilities[0, bag] = log_init[bag] + log_emissions[bag]
+
+    return log_probabilities, parents
+
+
+@numba.njit(cache=True)
+def _viterbi_core(
+    log_transition_matrix: np.ndarray[Any, np.dtype[np.float64]],
+    log_sampling_probabilities_by_marble: np.ndarray[Any, np.dtype[np.float64]],
+    log_init: np.ndarray[Any, np.dtype[np.float64]],
+    sequence: np.ndarray[Any, np.dtype[np.int64]],
+) -> Tuple[np.ndarray[Any, np.dtype[np.int32]], np.ndarray[Any, np.dtype[np.float64]]]:
+    """Runs the forward pass of Viterbi's algorithm on log-probabilities.
+
+    This function is compiled with Numba, so it only works with plain NumPy
+    arrays and performs no validation of its arguments.
+
+    Args:
+        log_transition_matrix: The (n, n) log-transition matrix of the HMM.
+        log_sampling_probabilities_by_marble: The (m, n) transpose of the
+            HMM's log-sampling probabilities, i.e., row e holds
+            log Pr(marble e | .) for every bag. This should be C-contiguous,
+            so that each row is a unit-stride vector.
+        log_init: The log-probabilities of starting in each bag.
+        sequence: A non-empty sequence of valid marbles.
+
+    Returns:
+        A pair (parents, log_probabilities), where parents[i][bag] is the most
+        likely parent of bag for marble i + 1, and log_probabilities holds the
+        log-probability of the most likely path ending in each bag.
+    """
+    log_probabilities, parents = _start_forward_pass(
+        log_sampling_probabilities_by_marble, log_init, sequence
+    )
+
+    for i in range(1, sequence.shape[0]):
+        _serial_viterbi_step(
+            log_probabilities[(i - 1) % 2],
+            log_transition_matrix,
+            log_sampling_probabilities_by_marble[sequence[i]],
+            log_probabilities[i % 2],
+            parents[i - 1],
+        )
+
+    return parents, log_probabilities[(sequence.shape[0] - 1) % 2]
+
+
+# Unlike the other kernels, this one is not cached on disk: Numba crashes when
+# loading a cached function that calls a parallel function (_viterbi_step).
+# For the same reason, it cannot share its loop with _viterbi_core by taking
+# the step as an argument; that also defeats caching, as Numba recompiles a
+# function for every dispatcher it is given.
+@numba.njit
+def _parallel_viterbi_core(
+    log_transition_matrix: np.ndarray[Any, np.dtype[np.float64]],
+    log_sampling_probabilities_by_marble: np.ndarray[Any, np.dtype[np.float64]],
+    log_init: np.ndarray[Any, np.dtype[np.float64]],
+    sequence: np.ndarray[Any, np.dtype[np.int64]],
+) -> Tuple[np.ndarray[Any, np.dtype[np.int32]], np.ndarray[Any, np.dtype[np.float64]]]:
+    """Same as _viterbi_core, but splits each step across threads (see
+    _viterbi_step)."""
+    log_probabilities, parents = _start_forward_pass(
+        log_sampling_probabilities_by_marble, log_init, sequence
+    )
+
+    for i in range(1, sequence.shape[0]):
+        _viterbi_step(
+            log_probabilities[(i - 1) % 2],
+            log_transition_matrix,
+            log_sampling_probabilities_by_marble[sequence[i]],
+            log_probabilities[i % 2],
+            parents[i - 1],
+        )
+
+    return parents, log_probabilities[(sequence.shape[0] - 1) % 2]
+
+
+def _make_viterbi_core(num_bags: int) -> Callable:
+    """Builds a forward pass of Viterbi's algorithm specialized to HMMs with
+    exactly num_bags bags.
+
+    The returned function behaves exactly like _viterbi_core, but its loops
+    over bags and parents are fully unrolled at code-generation time, so the
+    log-probabilities of every bag (and the entire log-transition matrix) are
+    kept in local variables that the compiler can hold in registers. This
+    only pays off for small HMMs, since the generated code grows with
+    num_bags^2.
+
+    Specializations are generated into a module under
+    _SPECIALIZED_CORES_DIR and compiled on first use, and Numba caches their
+    compiled code on disk, so later processes don't recompile them. If that
+    directory can't be written to, the generic _viterbi_core is used instead.
+
+    Args:
+        num_bags: The number of bags of the HMMs to specialize for.
+
+    Returns:
+        A Numba-compiled function with the same signature as _viterbi_core.
+    """
+    if num_bags in _specialized_viterbi_cores:
+        return _specialized_viterbi_cores[num_bags]
+
+    bags = range(num_bags)
+    lines: List[str] = [
+        "import numba",
+        "import numpy as np",
+        "",
+        "",
+        "@numba.njit(cache=True)",
+        f"def _viterbi_core_{num_bags}(",
+        "    log_transition_matrix,",
+        "    log_sampling_probabilities_by_marble,",
+        "    log_init,",
+        "    sequence,",
+        "):",
+        "    num_marbles = sequence.shape[0]",
+        f"    parents = np.empty((num_marbles - 1, {num_bags}), dtype=np.int32)",
+    ]
+    lines += [
+        f"    log_transition_{parent}_{bag} = log_transition_matrix[{parent}, {bag}]"
+        for parent in bags
+        for bag in bags
+    ]
+    lines.append(
+        "    log_emissions = log_sampling_probabilities_by_marble[sequence[0]]"
+    )
+    lines += [
+        f"    log_probability_{bag} = log_init[{bag}] + log_emissions[{bag}]"
+        for bag in bags
+    ]
+    lines += [
+        "    for i in range(1, num_marbles):",
+        "        log_emissions = log_sampling_probabilities_by_marble[sequence[i]]",
+    ]
+    for bag in bags:
+        lines += [
+            f"        best = log_probability_0 + log_transition_0_{bag}",
+            "        most_likely_parent = 0",
+        ]
+        for parent in bags[1:]:
+            lines += [
+                f"        p = log_probability_{parent} + log_transition_{parent}_{bag}",
+                "        if p > best:",
+                "            best = p",
+                f"            most_likely_parent = {parent}",
+            ]
+        lines += [
+            f"        new_log_probability_{bag} = best + log_emissions[{bag}]",
+            f"        parents[i - 1, {bag}] = most_likely_parent",
+        ]
+    lines += [
+        f"        log_probability_{bag} = new_log_probability_{bag}" for bag in bags
+    ]
+    lines.append(f"    log_probabilities = np.empty({num_bags}, dtype=np.float64)")
+    lines += [f"    log_probabilities[{bag}] = log_probability_{bag}" for bag in bags]
+    lines.append("    return parents, log_probabilities")
+
+    source = "\n".join(lines) + "\n"
+    path = _SPECIALIZED_CORES_DIR / f"viterbi_core_{num_bags}.py"
+
+    # Numba invalidates its cache whenever the source file is modified, so we
+    # only (atomically) rewrite the file if its contents actually changed.
+    try:
+        if not path.is_file() or path.read_text() != source:
+            _SPECIALIZED_CORES_DIR.mkdir(parents=True, exist_ok=True)
+            temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+            temporary_path.write_text(source)
+            os.replace(temporary_path, path)
+    except OSError as e:
+        _logger.debug(f"Cannot write specialized forward pass to {path}: {e}")
+        # Remember the fallback, so we don't retry the write for every HMM.
+        _specialized_viterbi_cores[num_bags] = _viterbi_core
+        return _viterbi_core
+
+    # Numba re-imports a function's module by name when loading it from its
+    # cache, so the module must be registered in sys.modules.
+    module_name = f"{__name__}.{path.stem}"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+
+    viterbi_core = getattr(module, f"_viterbi_core_{num_bags}")
+    _specialized_viterbi_cores[num_bags] = viterbi_core
+    return viterbi_core
+
+
+@numba.njit(cache=True)
+def _backtrack(
+    parents: np.ndarray[Any, np.dtype[np.int32]], most_likely_end_bag: int
+) -> np.ndarray[Any, np.dtype[np.intp]]:
+    """Reconstructs the most likely path of bags from a table of parents.
+
+    Args:
+        parents: The table of most likely parents computed by _viterbi_core.
+        most_likely_end_bag: The bag the most likely path ends in.
+
+    Returns:
+        The most likely path of bags ending in most_likely_end_bag.
+    """
+    path = np.empty(parents.shape[0] + 1, dtype=np.intp)
+    path[-1] = most_likely_end_bag
+
+    # Walk backwards from the final bag, looking up the parent of each bag.
+    for i in range(parents.shape[0] - 1, -1, -1):
+        path[i] = parents[i, path[i + 1]]
+
+    return path
+
+
+def _log_parameters(
+    hmm: HiddenMarkovModel,
+) -> Tuple[
+    np.ndarray[Any, np.dtype[np.float64]],
+    np.ndarray[Any, np.dtype[np.float64]],
+    np.ndarray[Any, np.dtype[np.float64]],
+]:
+    """Computes the float64 log-probabilities used by Viterbi's algorithm.
+
+    Args:
+        hmm: A Hidden Markov Model.
+
+    Returns:
+        A triple (log_transition_matrix, log_sampling_probabilities_by_marble,
+        log_steady_state), where log_sampling_probabilities_by_marble is the
+        C-contiguous (m, n) transpose of the HMM's log-sampling probabilities.
+
+    Raises:
+        ValueError: if the HMM does not provide a distribution on marbles for
+            each bag.
+    """
+    # The compiled forward passes don't check bounds, so we must make sure
+    # there is a distribution on marbles for every bag before running them.
+    if len(hmm.sampling_probabilities) != len(hmm.transition_matrix):
+        raise ValueError("Does not provide a distribution for each state!")
+
+    # Multiplying probabilities across many marbles quickly underflows, even
+    # with 128-bit floats. Instead, we work with log-probabilities throughout,
+    # which turns every product Pr(parent so far) * T(parent -> bag) into the
+    # sum log Pr(parent so far) + log T(parent -> bag). Impossible transitions
+    # and samples simply become -inf.
+    #
+    # Since log-probabilities don't underflow, we don't need the extended
+    # precision of the HMM's long doubles either: everything is converted to
+    # float64 before taking logs, so that all of the arithmetic runs on
+    # (vectorizable) 64-bit floats.
+    transition_matrix = hmm.transition_matrix.astype(np.float64)
+    sampling_probabilities = hmm.sampling_probabilities.astype(np.float64)
+
+    with np.errstate(divide="ignore"):
+        log_transition_matrix = np.log(transition_matrix)
+        log_sampling_probabilities = np.log(sampling_probabilities)
+        log_steady_state = np.log(hmm.steady_state_probabilities())
+
+    # Every step reads the sampling probabilities of a single marble for all
+    # bags, so we store them transposed and contiguous, by marble.
+    log_sampling_probabilities_by_marble = np.ascontiguousarray(
+        log_sampling_probabilities.transpose()
+    )
+
+    return log_transition_matrix, log_sampling_probabilities_by_marble, log_steady_state
+
+
+def _check_marbles(marbles: np.ndarray[Any, Any], num_marble_kinds: int) -> None:
+    """Checks that every marble can be drawn from an HMM with num_marble_kinds
+    kinds of marbles.
+
+    Args:
+        marbles: An array of marbles.
+        num_marble_kinds: The number of kinds of marbles in the HMM.
+
+    Raises:
+        IndexError: if some marble is not an integer in [0, num_marble_kinds).
+    """
+    if not np.issubdtype(marbles.dtype, np.integer):
+        raise IndexError("Marbles must be integers!")
+    if marbles.min() < 0 or marbles.max() >= num_marble_kinds:
+        raise IndexError("Sequence contains marbles not represented in the HMM!")
+
 
 def viterbi(hmm: HiddenMarkovModel, sequence: Sequence[int]) -> Sequence[int]:
     """Runs Viterbi's algorithm for determining the most likely sequences of
     "bags" for a given sequence of "marbles" for some Hidden Markov Model.
 
+    All computations are performed on float64 log-probabilities, which
+    trades the extended precision of the HMM's long doubles for speed. Ties
+    between paths whose probabilities differ by less than float64's precision
+    may therefore be broken arbitrarily.
+
     Args:
         hmm: A Hidden Markov Model.
         sequence: A sequence of marbles to draw. Each marble in the sequence
@@ -24,76 +438,142 @@ def viterbi(hmm: HiddenMarkovModel, sequence: Sequence[int]) -> Sequence[int]:
          of marbles.
 
     Raises:
+        ValueError: if the provided sequence is empty, or the HMM does not
+            provide a distribution on marbles for each bag.
         IndexError: if the provided sequences contains some marble that is not
             represented in the HMM's sampling probabilities.
     """
     if not sequence:
         raise ValueError("Cannot provide empty sequence of events!")
 
-    # Compute the initial probability vector of Pr(A) * Pr(E | A) for each
-    # "bag" A in the HMM and for the first "marble" E in the provided sequence.
-    # This new vector is computed efficiently (and maintaining the integrity of
-    # 128-bit floats) via the pair-wise vector computation Pr(.) * Pr(first marble | .):
-    first_marble = sequence[0]
-    probabilities = (
-        hmm.steady_state_probabilities()
-        * hmm.sampling_probabilities.transpose()[first_marble]
+    num_marbles = len(sequence)
+
+    (
+        log_transition_matrix,
+        log_sampling_probabilities_by_marble,
+        log_steady_state,
+    ) = _log_parameters(hmm)
+
+    marbles = np.asarray(sequence)
+    _check_marbles(marbles, log_sampling_probabilities_by_marble.shape[0])
+    marbles = marbles.astype(np.int64)
+
+    # The forward pass itself is compiled by Numba (see _viterbi_core). Each
+    # time we observe a new marble, it computes the most likely parent of
+    # every bag and keeps track of these most-likely parents. This will allow
+    # us to reconstruct the most likely path from the most likely bag at the
+    # end. Small HMMs get a forward pass specialized to their number of bags,
+    # and large HMMs get a forward pass that spreads each step over threads.
+    num_bags = len(log_transition_matrix)
+    if num_bags <= _MAX_SPECIALIZED_BAGS:
+        viterbi_core = _make_viterbi_core(num_bags)
+    elif num_bags >= _MIN_PARALLEL_BAGS:
+        viterbi_core = _parallel_viterbi_core
+    else:
+        viterbi_core = _viterbi_core
+
+    parents, log_probabilities = viterbi_core(
+        log_transition_matrix,
+        log_sampling_probabilities_by_marble,
+        log_steady_state,
+        marbles,
     )
-    _logger.info(f"Vector after marble 1: {probabilities}")
-
-    num_bags = len(hmm.transition_matrix)
-
-    # Each time we observe a new marble and compute the most-likely parent
-    # for each bag, we should keep track of these most-likely parents. This
-    # will allow us to reconstruct the most likely path from the most likely
-    # bag at the end.
-    parents_by_marble = []
-
-    for i, marble in enumerate(sequence[1:]):
-        new_probabilities = np.zeros(num_bags, dtype=np.longdouble)
-        new_parents = []
-
-        # We must find the most likely way to add each bag.
-        for bag in range(num_bags):
-            # We need to keep track of the most likely parent, and the
-            # respective probability of being in that parent state,
-            # transitioning to our current bag.
-            max_parent_probability = np.longdouble(0.0)
-            most_likely_parent = 0  # Placeholder
-
-            for parent_candidate, parent_probability in enumerate(probabilities):
-                # Find Pr(parent so far) * T(parent -> bag)
-                p = parent_probability * hmm.transition_matrix[parent_candidate][bag]
-
-                if p > max_parent_probability:
-                    max_parent_probability = p
-                    most_likely_parent = parent_candidate
-
-            # Now that we know that most likely parent, we multiply the
-            # probability of observing the current marble in our current bag,
-            # i.e., Pr(parent so far) * T(parent -> bag) * Pr(marble | bag).
-            p = max_parent_probability * hmm.sampling_probabilities[bag][marble]
-            new_probabilities[bag] = p
-            new_parents.append(most_likely_parent)
-            _logger.info(f"Selected {most_likely_parent} -> {bag} with p={p}")
-
-        probabilities = new_probabilities
-        parents_by_marble.append(new_parents)
-        _logger.info(f"Vector after marble {i + 2}: {new_probabilities}")
+
+    # Formatting the vector is only worthwhile if someone will read it.
+    if _logger.isEnabledFor(logging.DEBUG):
+        _logger.debug(
+            f"Log-probabilities after marble {num_marbles}: {log_probabilities}"
+        )
 
     # Now, we find the most likely end bag and reconstruct the path that was
     # taken to reach it.
-    most_likely_end_bag = int(np.argmax(probabilities))
+    most_likely_end_bag = int(np.argmax(log_probabilities))
+
+    return _backtrack(parents, most_likely_end_bag).tolist()
+
+
+def viterbi_batch(
+    hmm: HiddenMarkovModel, sequences: Sequence[Sequence[int]]
+) -> Sequence[Sequence[int]]:
+    """Runs Viterbi's algorithm on several sequences of "marbles" at once.
+
+    This is equivalent to calling viterbi(hmm, sequence) for each sequence,
+    but each step of Viterbi's algorithm is computed for every sequence in a
+    single vectorized operation. All sequences must have the same length.
+
+    Args:
+        hmm: A Hidden Markov Model.
+        sequences: A (b, t) array (or list of equal-length lists) of b
+            sequences of t marbles each. Each marble must be a valid sample in
+            the HMM.
+
+    Returns:
+        The most likely sequence of bags visited for each sequence of marbles,
+        in the same order as sequences.
+
+    Raises:
+        ValueError: if sequences is empty, is a single sequence rather than a
+            list of sequences, contains empty sequences, or contains sequences
+            of different lengths, or if the HMM does not provide a
+            distribution on marbles for each bag.
+        IndexError: if the provided sequences contain some marble that is not
+            represented in the HMM's sampling probabilities.
+    """
+    try:
+        marbles = np.asarray(sequences)
+    except ValueError as e:
+        raise ValueError("All sequences of events must have the same length!") from e
+
+    if marbles.size == 0:
+        raise ValueError("Cannot provide empty sequences of events!")
+    if marbles.ndim == 1:
+        raise ValueError("Must provide a list of sequences, not a single sequence!")
+    if marbles.ndim != 2:
+        raise ValueError("All sequences of events must have the same length!")
+
+    num_sequences, num_marbles = marbles.shape
+
+    (
+        log_transition_matrix,
+        log_sampling_probabilities_by_marble,
+        log_steady_state,
+    ) = _log_parameters(hmm)
+
+    _check_marbles(marbles, log_sampling_probabilities_by_marble.shape[0])
+    marbles = marbles.astype(np.int64)
+
+    num_bags = len(log_transition_matrix)
+
+    # parents[i][s][bag] holds the most likely parent of bag for marble i + 2
+    # of sequence s. Like the single-sequence kernels, we store parents in a
+    # single contiguous table of 32-bit ints, which is plenty for any number
+    # of bags and halves its size compared to 64-bit indices.
+    parents = np.empty((num_marbles - 1, num_sequences, num_bags), dtype=np.int32)
+
+    # log_probabilities[s][bag] holds the log-probability of the most likely
+    # path for sequence s ending in bag.
+    log_probabilities = (
+        log_steady_state[None, :] + log_sampling_probabilities_by_marble[marbles[:, 0]]
+    )
+
+    for i in range(1, num_marbles):
+        # scores[s][parent][bag] holds
+        # log Pr(parent so far) + log T(parent -> bag) for sequence s.
+        scores = log_probabilities[:, :, None] + log_transition_matrix[None, :, :]
+        parents[i - 1] = scores.argmax(axis=1)
+
+        log_probabilities = (
+            np.take_along_axis(scores, parents[i - 1][:, None, :], axis=1).squeeze(1)
+            + log_sampling_probabilities_by_marble[marbles[:, i]]
+        )
 
-    rev_path = [most_likely_end_bag]
-    last_visited_bag = most_likely_end_bag
-    for parent_array in reversed(parents_by_marble):
-        parent = parent_array[last_visited_bag]
+    # Now, we find the most likely end bag of each sequence and reconstruct
+    # the paths that were taken to reach them, all at once.
+    paths = np.empty((num_sequences, num_marbles), dtype=np.intp)
+    paths[:, -1] = log_probabilities.argmax(axis=1)
 
-        rev_path.append(parent)
-        last_visited_bag = parent
+    sequence_indices = np.arange(num_sequences)
+    for i in range(num_marbles - 2, -1, -1):
+        paths[:, i] = parents[i, sequence_indices, paths[:, i + 1]]
 
-    # We re-constructed the path beginning with the final bag and ending with
-    # the first bag, so we must finally reverse our path before returning.
-    rev_path.reverse()
-    return rev_path
+    return paths.tolist()
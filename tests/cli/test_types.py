@@ -85,3 +85,9 @@ def test_list_convert(value: Any, expected_result: Sequence[int]) -> None:
     actual = INT_LIST_TYPE.convert(value, None, None)
 
     assert expected_result == actual
+
+
+def test_matrix_convert_does_not_copy_longdouble_arrays() -> None:
+    value = np.array([[0.0, 1.2, 3.4], [5.8, 20.0, 21.2]], dtype=np.longdouble)
+
+    assert MATRIX_TYPE.convert(value, None, None) is value
@@ -99,6 +99,18 @@ def test_hmm_constructor(
             ),
             np.array([0.1935483871, 0.3548387097, 0.4516129032]),
         ),
+        pytest.param(
+            # Bag 0 is transient, so it is never visited in the long run.
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.5, 0.5], [0.0, 1.0]], dtype=np.longdouble
+                ),
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            np.array([0.0, 1.0]),
+        ),
     ],
 )
 def test_stationary_probabilities(
@@ -106,4 +118,30 @@ def test_stationary_probabilities(
 ) -> None:
     actual = hmm.steady_state_probabilities()
 
-    assert expected_result.all() == actual.all()
+    np.testing.assert_allclose(actual, expected_result, rtol=0.0, atol=1e-9)
+    assert (actual >= 0.0).all()
+    assert actual.sum() == pytest.approx(1.0)
+
+
+def test_stationary_probabilities_cached() -> None:
+    hmm = HiddenMarkovModel(
+        transition_matrix=np.array([[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble),
+        sampling_probabilities=np.array([[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble),
+    )
+
+    assert hmm.steady_state_probabilities() is hmm.steady_state_probabilities()
+
+
+def test_hmm_arrays_are_read_only_copies() -> None:
+    transition_matrix = np.array([[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble)
+    hmm = HiddenMarkovModel(
+        transition_matrix=transition_matrix,
+        sampling_probabilities=np.array([[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble),
+    )
+    steady_state = np.array(hmm.steady_state_probabilities())
+
+    transition_matrix[0] = [0.2, 0.8]
+
+    assert np.allclose(steady_state, hmm.steady_state_probabilities())
+    with pytest.raises(ValueError):
+        hmm.transition_matrix[0, 0] = 0.5
@@ -1,10 +1,12 @@
+from pathlib import Path
 from typing import Sequence
 
 import numpy as np
 import pytest
 
 from src.viterbi.hidden_markov_model import HiddenMarkovModel
-from src.viterbi.viterbi_algorithm import viterbi
+from src.viterbi import viterbi_algorithm
+from src.viterbi.viterbi_algorithm import viterbi, viterbi_batch
 
 
 @pytest.mark.parametrize(
@@ -23,6 +25,33 @@ from src.viterbi.viterbi_algorithm import viterbi
             [0, 0, 1, 0],  # Red, Red, Black, Red
             [0, 0, 0, 0],  # Bag 0, Bag 0, Bag 0, Bag 0
         ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                # Encoding Red -> 0, Black -> 1
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            # Long enough that multiplying probabilities would underflow.
+            [0] * 20000,  # Red, Red, ..., Red
+            [1] * 20000,  # Bag 1, Bag 1, ..., Bag 1
+        ),
+        pytest.param(
+            # Large enough not to use a forward pass specialized to its size.
+            # Every transition is equally likely and bag i almost always
+            # yields marble i, so the most likely bags are the marbles drawn.
+            HiddenMarkovModel(
+                transition_matrix=np.full((9, 9), 1 / 9, dtype=np.longdouble),
+                sampling_probabilities=(
+                    0.8875 * np.identity(9, dtype=np.longdouble) + 0.0125
+                ),
+            ),
+            [3, 1, 4, 1, 5, 8, 2, 6, 5, 3, 5],
+            [3, 1, 4, 1, 5, 8, 2, 6, 5, 3, 5],
+        ),
         pytest.param(
             HiddenMarkovModel(
                 transition_matrix=np.array(
@@ -37,6 +66,44 @@ from src.viterbi.viterbi_algorithm import viterbi
             None,
             marks=pytest.mark.xfail(raises=IndexError),
         ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                # Encoding Red -> 0, Black -> 1
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            [0.9, 2.7],  # Marbles must be integers
+            None,
+            marks=pytest.mark.xfail(raises=IndexError),
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                # Only a distribution for bag 0
+                sampling_probabilities=np.array([[0.4, 0.6]], dtype=np.longdouble),
+            ),
+            [0, 0, 1, 0],
+            None,
+            marks=pytest.mark.xfail(raises=ValueError),
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.full((40, 40), 1 / 40, dtype=np.longdouble),
+                # Only distributions for bags 0 and 1
+                sampling_probabilities=np.array(
+                    [[0.2, 0.3, 0.5], [0.5, 0.3, 0.2]], dtype=np.longdouble
+                ),
+            ),
+            [0, 2, 1, 2, 0],
+            None,
+            marks=pytest.mark.xfail(raises=ValueError),
+        ),
     ],
 )
 def test_viterbi(
@@ -47,3 +114,162 @@ def test_viterbi(
     actual = viterbi(hmm, sequence)
 
     assert expected_result == actual
+
+
+def test_parallel_viterbi_matches_serial(monkeypatch: pytest.MonkeyPatch) -> None:
+    rng = np.random.default_rng(0)
+    num_bags = viterbi_algorithm._MIN_PARALLEL_BAGS
+    transition_matrix = rng.random((num_bags, num_bags))
+    sampling_probabilities = rng.random((num_bags, 3))
+    hmm = HiddenMarkovModel(
+        transition_matrix=transition_matrix
+        / transition_matrix.sum(axis=1, keepdims=True),
+        sampling_probabilities=sampling_probabilities
+        / sampling_probabilities.sum(axis=1, keepdims=True),
+    )
+    sequence = rng.integers(0, 3, 50).tolist()
+
+    parallel = viterbi(hmm, sequence)
+    monkeypatch.setattr(viterbi_algorithm, "_MIN_PARALLEL_BAGS", num_bags + 1)
+
+    assert viterbi(hmm, sequence) == parallel
+
+
+def test_specialized_viterbi_core_falls_back_when_unwritable(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # A directory inside a regular file can never be created.
+    monkeypatch.setattr(
+        viterbi_algorithm, "_SPECIALIZED_CORES_DIR", Path(__file__) / "cores"
+    )
+    monkeypatch.setattr(viterbi_algorithm, "_specialized_viterbi_cores", {})
+
+    viterbi_core = viterbi_algorithm._make_viterbi_core(2)
+
+    assert viterbi_core is viterbi_algorithm._viterbi_core
+    assert viterbi_algorithm._specialized_viterbi_cores == {2: viterbi_core}
+
+
+@pytest.mark.parametrize(
+    "hmm,sequences",
+    [
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            [[0, 0, 1, 0], [1, 1, 1, 1], [0, 0, 0, 0], [1, 0, 0, 1]],
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.4, 0.4, 0.2], [0.2, 0.4, 0.4], [0.1, 0.3, 0.6]],
+                    dtype=np.longdouble,
+                ),
+                sampling_probabilities=np.array(
+                    [[0.7, 0.2, 0.1], [0.1, 0.8, 0.1], [0.2, 0.2, 0.6]],
+                    dtype=np.longdouble,
+                ),
+            ),
+            [[2], [1], [0]],
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.4, 0.4, 0.2], [0.2, 0.4, 0.4], [0.1, 0.3, 0.6]],
+                    dtype=np.longdouble,
+                ),
+                sampling_probabilities=np.array(
+                    [[0.7, 0.2, 0.1], [0.1, 0.8, 0.1], [0.2, 0.2, 0.6]],
+                    dtype=np.longdouble,
+                ),
+            ),
+            [[0, 1, 2, 2, 1, 0, 0], [2, 2, 2, 1, 1, 0, 2]],
+        ),
+        pytest.param(
+            # Large enough not to use a forward pass specialized to its size.
+            HiddenMarkovModel(
+                transition_matrix=(
+                    0.5 * np.identity(9, dtype=np.longdouble)
+                    + 0.3 * np.roll(np.identity(9, dtype=np.longdouble), 1, axis=1)
+                    + 0.2 * np.roll(np.identity(9, dtype=np.longdouble), 2, axis=1)
+                ),
+                sampling_probabilities=np.array(
+                    [[0.7, 0.2, 0.1], [0.1, 0.8, 0.1], [0.2, 0.2, 0.6]] * 3,
+                    dtype=np.longdouble,
+                ),
+            ),
+            [[0, 1, 2, 2, 1, 0, 0, 1, 1], [2, 2, 2, 1, 1, 0, 2, 0, 0]],
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            [[0, 0, 1, 0], [1, 1, 1]],  # Sequences of different lengths
+            marks=pytest.mark.xfail(raises=ValueError),
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            [],
+            marks=pytest.mark.xfail(raises=ValueError),
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            [[0, 0, 1, 0], [1, 1, 2, 1]],
+            marks=pytest.mark.xfail(raises=IndexError),
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                # Only a distribution for bag 0
+                sampling_probabilities=np.array([[0.4, 0.6]], dtype=np.longdouble),
+            ),
+            [[0, 0, 1, 0]],
+            marks=pytest.mark.xfail(raises=ValueError),
+        ),
+        pytest.param(
+            HiddenMarkovModel(
+                transition_matrix=np.array(
+                    [[0.8, 0.2], [0.5, 0.5]], dtype=np.longdouble
+                ),
+                sampling_probabilities=np.array(
+                    [[0.4, 0.6], [0.7, 0.3]], dtype=np.longdouble
+                ),
+            ),
+            [0, 1, 0],  # A single sequence, rather than a list of sequences
+            marks=pytest.mark.xfail(raises=ValueError),
+        ),
+    ],
+)
+def test_viterbi_batch(
+    hmm: HiddenMarkovModel,
+    sequences: Sequence[Sequence[int]],
+) -> None:
+    actual = viterbi_batch(hmm, sequences)
+
+    assert [viterbi(hmm, sequence) for sequence in sequences] == actual